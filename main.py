@@ -4,16 +4,43 @@ Tor Crawler - CLI interface
 """
 
 import asyncio
-import argparse
 import sys
 from pathlib import Path
+from types import SimpleNamespace
+
+
+# Flag -> (destination, type, choices) for the fast-path argument parser.
+# Must stay in sync with build_argument_parser().
+_OPTIONS = {
+    '--config': ('config', str, None),
+    '-c': ('config', str, None),
+    '--start-url': ('start_url', str, None),
+    '-u': ('start_url', str, None),
+    '--max-depth': ('max_depth', int, None),
+    '-d': ('max_depth', int, None),
+    '--max-pages': ('max_pages', int, None),
+    '-p': ('max_pages', int, None),
+    '--storage': ('storage', str, ('json', 'sqlite')),
+    '-s': ('storage', str, ('json', 'sqlite')),
+    '--delay': ('delay', float, None),
+    '--log-level': ('log_level', str, ('DEBUG', 'INFO', 'WARNING', 'ERROR')),
+}
+
+_DEFAULTS = {
+    'config': 'config.yaml',
+    'start_url': None,
+    'max_depth': None,
+    'max_pages': None,
+    'storage': None,
+    'delay': None,
+    'log_level': 'INFO',
+}
+
+
+def build_argument_parser():
+    """Build the full argparse parser (used for --help and invalid input)"""
+    import argparse
 
-from src.config import Config
-from src.crawler import TorCrawler
-
-
-def parse_arguments():
-    """Parse command line arguments"""
     parser = argparse.ArgumentParser(
         description='Tor Crawler - Secure and ethical .onion sites explorer',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -81,7 +108,58 @@ SECURITY & ETHICS:
         help='Log level (default: INFO)'
     )
 
-    return parser.parse_args()
+    return parser
+
+
+def parse_arguments(argv=None):
+    """
+    Parse command line arguments
+
+    Known flags are handled without importing argparse. Help requests and
+    anything unrecognized or malformed fall back to the argparse parser,
+    which prints the usual usage/error output.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    values = dict(_DEFAULTS)
+
+    try:
+        i = 0
+        while i < len(argv):
+            flag = argv[i]
+            if flag.startswith('--') and '=' in flag:
+                flag, value = flag.split('=', 1)
+                i += 1
+            else:
+                value = argv[i + 1]
+                i += 2
+
+            dest, type_, choices = _OPTIONS[flag]
+            value = type_(value)
+            if choices and value not in choices:
+                raise ValueError(value)
+            values[dest] = value
+
+    except (IndexError, KeyError, ValueError):
+        return build_argument_parser().parse_args(argv)
+
+    return SimpleNamespace(**values)
+
+
+def exit_with_error(message: str):
+    """Write error message to stderr in one write and exit"""
+    sys.stderr.write(message + "\n")
+    sys.stderr.flush()
+    sys.exit(1)
+
+
+def exit_config_not_found(config_file: str):
+    """Report a missing configuration file and exit"""
+    exit_with_error(
+        f"❌ Error: Configuration file not found: {config_file}\n"
+        f"Create the file or use --config parameter to point to an existing file.\n"
+        f"\nYou can also specify settings from command line:\n"
+        f"  python main.py --start-url 'http://example.onion' --max-pages 50"
+    )
 
 
 async def main():
@@ -91,11 +169,11 @@ async def main():
     # Check that config file exists
     config_path = Path(args.config)
     if not config_path.exists():
-        print(f"❌ Error: Configuration file not found: {args.config}")
-        print(f"Create the file or use --config parameter to point to an existing file.")
-        print(f"\nYou can also specify settings from command line:")
-        print(f"  python main.py --start-url 'http://example.onion' --max-pages 50")
-        sys.exit(1)
+        exit_config_not_found(args.config)
+
+    # Imported here so --help and early errors skip loading the crawler stack
+    from src.config import Config
+    from src.crawler import TorCrawler
 
     try:
         # Load configuration
@@ -124,16 +202,13 @@ async def main():
         config.validate()
 
     except FileNotFoundError:
-        print(f"❌ Error: Configuration file not found: {args.config}")
-        sys.exit(1)
+        exit_config_not_found(args.config)
 
     except ValueError as e:
-        print(f"❌ Configuration error: {e}")
-        sys.exit(1)
+        exit_with_error(f"❌ Configuration error: {e}")
 
     except Exception as e:
-        print(f"❌ Unexpected error in configuration: {e}")
-        sys.exit(1)
+        exit_with_error(f"❌ Unexpected error in configuration: {e}")
 
     # Create and run crawler
     crawler = TorCrawler(config)
@@ -143,23 +218,28 @@ async def main():
         await crawler.crawl()
 
     except ConnectionError as e:
-        print(f"\n❌ Connection error: {e}")
-        print(f"\nEnsure that Tor is running:")
-        print(f"  - Linux/Mac: 'tor' or 'brew services start tor'")
-        print(f"  - Windows: Start Tor Browser or install Tor Expert Bundle")
-        print(f"  - Docker: 'docker run -d -p 9050:9050 dperson/torproxy'")
-        sys.exit(1)
+        exit_with_error(
+            f"\n❌ Connection error: {e}\n"
+            f"\nEnsure that Tor is running:\n"
+            f"  - Linux/Mac: 'tor' or 'brew services start tor'\n"
+            f"  - Windows: Start Tor Browser or install Tor Expert Bundle\n"
+            f"  - Docker: 'docker run -d -p 9050:9050 dperson/torproxy'"
+        )
 
     except KeyboardInterrupt:
-        print("\n\n⚠ Crawl interrupted by user")
+        sys.stderr.write("\n\n⚠ Crawl interrupted by user\n")
+        sys.stderr.flush()
 
     except Exception as e:
-        print(f"\n❌ Critical error: {e}")
         import traceback
-        traceback.print_exc()
-        sys.exit(1)
+        exit_with_error(f"\n❌ Critical error: {e}\n{traceback.format_exc().rstrip()}")
 
 
 if __name__ == '__main__':
-    # Run async main
-    asyncio.run(main())
+    # Run async main (on uvloop when installed; not available on Windows)
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -0,0 +1,105 @@
+"""
+Bloom filters for memory-efficient URL membership tests
+
+Keys are 64-bit URL hashes (see utils.url_hash).
+"""
+
+import math
+from typing import List, Tuple
+
+_MASK64 = (1 << 64) - 1
+
+
+def _hash_pair(key: int) -> Tuple[int, int]:
+    """
+    Derive two 64-bit hashes from a 64-bit key hash
+
+    All k probe positions are synthesized from these two values
+    (Kirsch-Mitzenmacher double hashing). The second value is the
+    splitmix64 finalizer of the key, so no string is hashed here.
+    """
+    h2 = (key ^ (key >> 30)) * 0xbf58476d1ce4e5b9 & _MASK64
+    h2 = (h2 ^ (h2 >> 27)) * 0x94d049bb133111eb & _MASK64
+    return key, (h2 ^ (h2 >> 31)) | 1
+
+
+class BloomFilter:
+    """
+    Fixed-capacity Bloom filter
+
+    Membership tests may return false positives (at roughly error_rate once
+    capacity items are stored) but never false negatives.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: int):
+        h1, h2 = _hash_pair(key)
+        num_bits = self.num_bits
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % num_bits
+
+    def add(self, key: int) -> bool:
+        """Add key; returns True if it was (probably) already present"""
+        present = True
+        bits = self.bits
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                present = False
+                bits[pos >> 3] |= mask
+
+        if not present:
+            self.count += 1
+        return present
+
+    def __contains__(self, key: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class ScalableBloomFilter:
+    """
+    Bloom filter that grows by chaining larger filters
+
+    Each new filter has `growth` times the capacity and a tighter error
+    rate, keeping the overall false positive rate close to error_rate.
+    """
+
+    def __init__(self, initial_capacity: int = 100_000, error_rate: float = 1e-4,
+                 growth: int = 2, tightening: float = 0.9):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters: List[BloomFilter] = []
+
+    def add(self, key: int) -> bool:
+        """Add key; returns True if it was (probably) already present"""
+        if key in self:
+            return True
+
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            n = len(self.filters)
+            self.filters.append(BloomFilter(
+                self.initial_capacity * self.growth ** n,
+                self.error_rate * (1 - self.tightening) * self.tightening ** n
+            ))
+
+        self.filters[-1].add(key)
+        return False
+
+    def __contains__(self, key: int) -> bool:
+        return any(key in f for f in reversed(self.filters))
+
+    def __len__(self) -> int:
+        return sum(f.count for f in self.filters)
@@ -2,12 +2,24 @@
 Configuration management for Tor Crawler
 """
 
+import hashlib
+import json
 import os
 import yaml
 from dataclasses import dataclass, field
 from typing import Optional, List
 from pathlib import Path
 
+from .utils import ONION_URL_RE
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# Per-user cache directory (parsed config files, Tor verification stamps)
+CONFIG_CACHE_DIR = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "tor-crawler"
+
 
 @dataclass
 class TorConfig:
@@ -17,6 +29,7 @@ class TorConfig:
     control_port: int = 9051
     control_password: Optional[str] = None
     use_stem: bool = False  # Whether to use stem library for circuit renewal
+    verify_on_start: bool = False  # Check via check.torproject.org that traffic goes through Tor
 
 
 @dataclass
@@ -26,8 +39,10 @@ class CrawlerConfig:
     max_depth: int = 3
     max_pages: int = 100
     max_pages_per_domain: int = 50
-    request_delay: float = 2.0  # Seconds between requests
+    request_delay: float = 2.0  # Seconds between requests (per domain)
+    concurrency: int = 4  # Number of pages fetched in parallel
     request_timeout: int = 30  # Seconds
+    max_html_bytes: int = 2 * 1024 * 1024  # Only this much of each page is downloaded and parsed
     user_agent: str = "Mozilla/5.0 (Windows NT 10.0; rv:91.0) Gecko/20100101 Firefox/91.0"
     follow_external_onion: bool = True  # Whether to follow other .onion domains
     allowed_domains: List[str] = field(default_factory=list)  # Empty = all .onion
@@ -44,6 +59,7 @@ class StorageConfig:
     sqlite_filename: str = "crawler.db"
     save_html_content: bool = False  # Whether to save full HTML
     max_content_length: int = 1000  # Maximum characters for stored content
+    save_batch_size: int = 32  # Pages buffered per storage write (one transaction)
 
 
 @dataclass
@@ -57,8 +73,7 @@ class Config:
     @classmethod
     def from_yaml(cls, yaml_path: str) -> "Config":
         """Load configuration from YAML file"""
-        with open(yaml_path, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
+        data = cls._load_yaml_data(yaml_path)
 
         # Override with environment variables (ENV priority)
         tor_config = TorConfig(
@@ -66,7 +81,8 @@ class Config:
             proxy_port=int(os.getenv("TOR_PROXY_PORT", data.get("tor", {}).get("proxy_port", 9050))),
             control_port=int(os.getenv("TOR_CONTROL_PORT", data.get("tor", {}).get("control_port", 9051))),
             control_password=os.getenv("TOR_CONTROL_PASSWORD", data.get("tor", {}).get("control_password")),
-            use_stem=data.get("tor", {}).get("use_stem", False)
+            use_stem=data.get("tor", {}).get("use_stem", False),
+            verify_on_start=data.get("tor", {}).get("verify_on_start", False)
         )
 
         crawler_data = data.get("crawler", {})
@@ -76,7 +92,9 @@ class Config:
             max_pages=int(os.getenv("MAX_PAGES", crawler_data.get("max_pages", 100))),
             max_pages_per_domain=int(crawler_data.get("max_pages_per_domain", 50)),
             request_delay=float(crawler_data.get("request_delay", 2.0)),
+            concurrency=int(crawler_data.get("concurrency", 4)),
             request_timeout=int(crawler_data.get("request_timeout", 30)),
+            max_html_bytes=int(crawler_data.get("max_html_bytes", 2 * 1024 * 1024)),
             user_agent=crawler_data.get("user_agent", "Mozilla/5.0 (Windows NT 10.0; rv:91.0) Gecko/20100101 Firefox/91.0"),
             follow_external_onion=crawler_data.get("follow_external_onion", True),
             allowed_domains=crawler_data.get("allowed_domains", []),
@@ -91,7 +109,8 @@ class Config:
             json_filename=storage_data.get("json_filename", "crawled_pages.json"),
             sqlite_filename=storage_data.get("sqlite_filename", "crawler.db"),
             save_html_content=storage_data.get("save_html_content", False),
-            max_content_length=int(storage_data.get("max_content_length", 1000))
+            max_content_length=int(storage_data.get("max_content_length", 1000)),
+            save_batch_size=int(storage_data.get("save_batch_size", 32))
         )
 
         return cls(
@@ -101,6 +120,47 @@ class Config:
             log_level=os.getenv("LOG_LEVEL", data.get("log_level", "INFO"))
         )
 
+    @staticmethod
+    def _load_yaml_data(yaml_path: str) -> dict:
+        """
+        Parse YAML file, reusing parsed data cached in CONFIG_CACHE_DIR
+
+        The cache entry (one JSON file per config path) stores a hash of
+        the YAML content and is only used while it matches. Data that JSON
+        can't round-trip exactly (e.g. non-string keys) is not cached.
+        """
+        path = Path(yaml_path).resolve()
+        raw = path.read_bytes()
+        digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        path_key = hashlib.blake2b(str(path).encode(), digest_size=8).hexdigest()
+        cache = CONFIG_CACHE_DIR / f"config-{path_key}.json"
+
+        try:
+            cached = json.loads(cache.read_bytes())
+            if cached["digest"] == digest:
+                return cached["data"]
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+
+        # libyaml reads bytes directly, skipping the Python-level decode
+        data = yaml.load(raw, Loader=SafeLoader)
+
+        try:
+            encoded = json.dumps({"digest": digest, "data": data})
+            if json.loads(encoded)["data"] == data:
+                CONFIG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                # Owner-only: the config may contain the Tor control password;
+                # written to a temporary file first so readers never see half of it
+                tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+                fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(encoded)
+                os.replace(tmp, cache)
+        except (OSError, TypeError, ValueError):
+            pass  # Unwritable cache directory or non-JSON values; skip caching
+
+        return data
+
     def validate(self) -> bool:
         """Validate configuration"""
         errors = []
@@ -108,8 +168,8 @@ class Config:
         if not self.crawler.start_url:
             errors.append("start_url cannot be empty")
 
-        if not self.crawler.start_url.endswith(".onion") and ".onion" not in self.crawler.start_url:
-            errors.append("start_url must be a .onion address")
+        if not ONION_URL_RE.match(self.crawler.start_url):
+            errors.append("start_url must be an http(s) URL on a valid .onion address")
 
         if self.crawler.max_depth < 1:
             errors.append("max_depth must be at least 1")
@@ -120,9 +180,18 @@ class Config:
         if self.crawler.request_delay < 0:
             errors.append("request_delay cannot be negative")
 
+        if self.crawler.concurrency < 1:
+            errors.append("concurrency must be at least 1")
+
+        if self.crawler.max_html_bytes < 1:
+            errors.append("max_html_bytes must be at least 1")
+
         if self.storage.storage_type not in ["json", "sqlite"]:
             errors.append("storage_type must be 'json' or 'sqlite'")
 
+        if self.storage.save_batch_size < 1:
+            errors.append("save_batch_size must be at least 1")
+
         if errors:
             raise ValueError(f"Configuration errors:\n" + "\n".join(f"  - {e}" for e in errors))
 
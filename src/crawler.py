@@ -3,18 +3,38 @@ Tor Crawler core logic
 """
 
 import asyncio
-from collections import deque
-from datetime import datetime
-from typing import Set, Dict, Any, Optional
+import itertools
+import math
+import time
+from collections import Counter, defaultdict, OrderedDict
+from typing import Set, Dict, Any, List, Optional, Union
 from urllib.parse import urlparse
 import logging
 
 from .config import Config
 from .tor_client import TorClient
+from .bloom import ScalableBloomFilter
 from .parser import HTMLParser
 from .storage.base import BaseStorage
 from .storage import JSONStorage, SQLiteStorage
-from .utils import extract_domain, setup_logger
+from .utils import canonicalize_url, extract_domain, setup_logger, url_hash
+
+
+# Number of recently visited URLs kept exactly in memory
+VISITED_RECENT_SIZE = 10_000
+
+# Maximum number of URLs waiting in the queue (a hard cap on the frontier's
+# memory); further links are dropped, counted and reported in progress logs
+MAX_QUEUE_SIZE = 10_000
+
+# Content types parsed as HTML ('' = server sent none)
+HTML_CONTENT_TYPES = frozenset(('', 'text/html', 'application/xhtml+xml'))
+
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 5.0
+
+# Queue item telling a worker to exit (sorts after every real item)
+STOP = (math.inf, 0, None)
 
 
 class TorCrawler:
@@ -32,11 +52,32 @@ class TorCrawler:
         self.storage: Optional[BaseStorage] = None
 
         # Crawl state
-        self.visited_urls: Set[str] = set()
-        self.queue: deque = deque()
-        self.domain_counters: Dict[str, int] = {}  # Domain -> page count
+        # Visited URLs (as url_hash keys), set up in initialize(): the
+        # storage's read-only set of saved pages if it keeps one, plus the
+        # pages claimed but not saved yet (exact), otherwise a Bloom filter
+        # that answers "not seen" cheaply, with recent keys kept exactly and
+        # storage confirming the remaining Bloom hits
+        self.visited_keys: Union[Set[int], ScalableBloomFilter, None] = None
+        self.visited_exact = False
+        self.visited_unsaved: Set[int] = set()
+        self.visited_recent: OrderedDict = OrderedDict()
+        # Frontier: (depth, -seq, url) - levels in BFS order, newest URL
+        # first within a level (its strings are still hot in cache)
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue(maxsize=MAX_QUEUE_SIZE)
+        self._queue_seq = itertools.count()
+        self.enqueued: Set[str] = set()  # URLs currently in queue
+        self._dropped_links = 0  # Links not queued because the queue was full
+        self.domain_counters: Counter = Counter()  # Domain -> page count
+        self.domain_locks: Dict[Optional[str], asyncio.Lock] = defaultdict(asyncio.Lock)
+        self.domain_last_fetch: Dict[Optional[str], float] = {}  # Domain -> loop time
         self.total_crawled = 0
+        self._successful = 0
+        self._errors = 0
+        self._pending: List[Dict[str, Any]] = []  # Pages waiting to be saved
         self.start_domain: Optional[str] = None
+        self.request_headers: Dict[str, str] = {}  # Built once in initialize()
+        # Lowercase like extract_domain results, so links compare without case folding
+        self.allowed_domains = frozenset(domain.lower() for domain in config.crawler.allowed_domains)
 
     async def initialize(self):
         """Initialize crawler components"""
@@ -45,8 +86,13 @@ class TorCrawler:
         self.logger.info("=" * 80)
 
         # Initialize Tor connection
-        self.tor_client = TorClient(self.config.tor, logger=self.logger)
+        self.tor_client = TorClient(
+            self.config.tor,
+            logger=self.logger,
+            max_connections=self.config.crawler.concurrency
+        )
         await self.tor_client.initialize()
+        self.request_headers = {'User-Agent': self.config.crawler.user_agent}
 
         # Initialize storage
         if self.config.storage.storage_type == "json":
@@ -67,86 +113,169 @@ class TorCrawler:
         await self.storage.initialize()
 
         # Load previously visited URLs
-        self.visited_urls = await self.storage.get_visited_urls()
+        visited = self.storage.get_visited_set()
+        if visited is not None:
+            self.visited_keys = visited
+            self.visited_exact = True
+        else:
+            self.visited_keys = ScalableBloomFilter(initial_capacity=100_000, error_rate=1e-4)
+            for key in await self.storage.get_visited_hashes():
+                self.visited_keys.add(key)
 
         # Add start URL to queue
-        self.start_domain = extract_domain(self.config.crawler.start_url)
-        self.queue.append((self.config.crawler.start_url, 0))  # (url, depth)
+        start_url = canonicalize_url(self.config.crawler.start_url)
+        self.start_domain = extract_domain(start_url)
+        self._enqueue(start_url, 0)
 
         self.logger.info(f"✓ Crawler initialized")
         self.logger.info(f"  Start URL: {self.config.crawler.start_url}")
         self.logger.info(f"  Max depth: {self.config.crawler.max_depth}")
         self.logger.info(f"  Max pages: {self.config.crawler.max_pages}")
+        self.logger.info(f"  Concurrency: {self.config.crawler.concurrency}")
         self.logger.info(f"  Storage: {self.config.storage.storage_type}")
-        self.logger.info(f"  Previously visited: {len(self.visited_urls)}")
+        self.logger.info(f"  Previously visited: {len(self.visited_keys)}")
         self.logger.info("=" * 80)
 
     async def crawl(self):
-        """Main crawl loop (BFS)"""
+        """Main crawl loop (BFS with a pool of concurrent workers)"""
+        workers = []
+        progress_task = None
         try:
-            while self.queue and self.total_crawled < self.config.crawler.max_pages:
-                # Get next URL from queue
-                url, depth = self.queue.popleft()
+            workers = [
+                asyncio.create_task(self._worker())
+                for _ in range(self.config.crawler.concurrency)
+            ]
+            progress_task = asyncio.create_task(self._periodic_progress())
 
-                # Check if already visited
-                if url in self.visited_urls:
-                    continue
+            # Wait until every queued URL (including newly discovered ones) is handled
+            await self.queue.join()
+
+            # Queue drained and nothing in flight: stop workers
+            for _ in workers:
+                await self.queue.put(STOP)
+            await asyncio.gather(*workers)
+            await self._flush_pending()
+
+            # Final statistics
+            await self._log_final_stats()
+
+        except KeyboardInterrupt:
+            self.logger.warning("\n⚠ Crawling interrupted by user")
+            await self._flush_pending()
+            await self._log_final_stats()
+
+        except Exception as e:
+            self.logger.error(f"Critical error during crawl: {e}", exc_info=True)
+
+        finally:
+            if progress_task:
+                progress_task.cancel()
+            for worker in workers:
+                worker.cancel()
+            await self.close()
+
+    async def _worker(self):
+        """Crawl URLs from the queue until STOP is received"""
+        while True:
+            item = await self.queue.get()
+            try:
+                if item is STOP:
+                    return
+
+                depth, _, url = item
+                self.enqueued.discard(url)
 
                 # Check depth
                 if depth > self.config.crawler.max_depth:
                     continue
 
-                # Check domain limits
+                key = url_hash(url)
                 domain = extract_domain(url)
-                if domain:
-                    if self.domain_counters.get(domain, 0) >= self.config.crawler.max_pages_per_domain:
-                        self.logger.debug(f"Domain limit reached: {domain}")
-                        continue
+                if not self._within_limits(key, domain):
+                    continue
+
+                # Check if already visited
+                if await self._is_visited(url, key):
+                    continue
+
+                # Rate limiting (per domain)
+                await self._wait_for_domain(domain)
+
+                # Re-check: other workers may have claimed the URL or
+                # reached a limit while we were waiting
+                if not self._claim(key, domain):
+                    continue
 
                 # Crawl page
                 await self._crawl_page(url, depth)
 
-                # Rate limiting
-                if self.config.crawler.request_delay > 0:
-                    await asyncio.sleep(self.config.crawler.request_delay)
+            except Exception as e:
+                self.logger.error(f"Error crawling {item[2]}: {e}", exc_info=True)
 
-                # Statistics
-                if self.total_crawled % 10 == 0:
-                    await self._log_progress()
+            finally:
+                self.queue.task_done()
 
-            # Final statistics
-            await self._log_final_stats()
+    def _within_limits(self, key: int, domain: Optional[str]) -> bool:
+        """Check page limits and whether URL (by url_hash key) was already claimed by a worker"""
+        if self.total_crawled >= self.config.crawler.max_pages:
+            return False
 
-        except KeyboardInterrupt:
-            self.logger.warning("\n⚠ Crawling interrupted by user")
-            await self._log_final_stats()
+        if self._is_claimed(key):
+            return False
 
-        except Exception as e:
-            self.logger.error(f"Critical error during crawl: {e}", exc_info=True)
+        # Check domain limits
+        if domain:
+            if self.domain_counters[domain] >= self.config.crawler.max_pages_per_domain:
+                self.logger.debug(f"Domain limit reached: {domain}")
+                return False
 
-        finally:
-            await self.close()
+        return True
 
-    async def _crawl_page(self, url: str, depth: int):
-        """Crawl single page"""
-        self.logger.info(f"[{self.total_crawled + 1}/{self.config.crawler.max_pages}] "
-                        f"Depth {depth}: {url}")
+    def _claim(self, key: int, domain: Optional[str]) -> bool:
+        """
+        Check limits and reserve a page slot for URL (by url_hash key)
+
+        This is the workers' critical section. It never awaits, so on a
+        single event loop the check and the counter updates are atomic
+        without a lock.
+        """
+        if not self._within_limits(key, domain):
+            return False
 
         # Mark as visited
-        self.visited_urls.add(url)
+        self._mark_visited(key)
         self.total_crawled += 1
 
         # Update domain counter
-        domain = extract_domain(url)
         if domain:
-            self.domain_counters[domain] = self.domain_counters.get(domain, 0) + 1
+            self.domain_counters[domain] += 1
+
+        return True
+
+    async def _wait_for_domain(self, domain: Optional[str]):
+        """Wait until request_delay has passed since the last request to domain"""
+        delay = self.config.crawler.request_delay
+        if delay <= 0:
+            return
+
+        loop = asyncio.get_running_loop()
+        async with self.domain_locks[domain]:
+            wait = self.domain_last_fetch.get(domain, 0.0) + delay - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.domain_last_fetch[domain] = loop.time()
+
+    async def _crawl_page(self, url: str, depth: int):
+        """Crawl single page (claimed with _claim)"""
+        self.logger.info(f"[{self.total_crawled}/{self.config.crawler.max_pages}] "
+                        f"Depth {depth}: {url}")
 
         # Fetch page
-        headers = {'User-Agent': self.config.crawler.user_agent}
         response = await self.tor_client.fetch(
             url,
-            headers=headers,
-            timeout=self.config.crawler.request_timeout
+            headers=self.request_headers,
+            timeout=self.config.crawler.request_timeout,
+            max_bytes=self.config.crawler.max_html_bytes
         )
 
         # Parse page
@@ -154,13 +283,23 @@ class TorCrawler:
             'url': url,
             'status': response['status'],
             'depth': depth,
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp_ns': time.time_ns(),  # Formatted by storage on write
             'error': response.get('error')
         }
 
-        if response['status'] == 200 and response['content']:
+        if page_data['error']:
+            self._errors += 1
+        else:
+            self._successful += 1
+
+        content = response['content']
+        if (response['status'] == 200 and content
+                and response.get('content_type', '') in HTML_CONTENT_TYPES):
+            if response.get('truncated'):
+                self.logger.debug(f"  Page truncated to {len(content)} bytes: {url}")
+
             # Parse HTML
-            parsed = self.parser.parse(response['content'], url)
+            parsed = self.parser.parse(content, url, response.get('charset'))
             page_data.update({
                 'title': parsed['title'],
                 'text_preview': parsed['text_preview'],
@@ -170,17 +309,21 @@ class TorCrawler:
             # Filter .onion links
             onion_links = self.parser.filter_onion_links(
                 parsed['links'],
-                allowed_domains=self.config.crawler.allowed_domains,
+                allowed_domains=self.allowed_domains,
                 follow_external=self.config.crawler.follow_external_onion,
                 base_domain=self.start_domain
             )
 
             page_data['links'] = onion_links
 
-            # Add new links to queue
-            for link in onion_links:
-                if link not in self.visited_urls:
-                    self.queue.append((link, depth + 1))
+            # Add new links to queue (links from max depth pages can't be followed)
+            if depth < self.config.crawler.max_depth:
+                # Links are already canonical and unique (see the parser);
+                # drop queued URLs in one set operation
+                new_links = set(onion_links) - self.enqueued
+                for link in new_links:
+                    if not await self._is_visited(link, url_hash(link)):
+                        self._enqueue(link, depth + 1)
 
             self.logger.info(f"  ✓ {response['status']} - {parsed['title'][:50]} - {len(onion_links)} links")
 
@@ -191,17 +334,86 @@ class TorCrawler:
                 'meta': {},
                 'links': []
             })
-            self.logger.warning(f"  ✗ {response['status']} - Error: {response.get('error', 'Unknown')}")
-
-        # Save
-        await self.storage.save_page(page_data)
+            if page_data['error'] or response['status'] != 200:
+                self.logger.warning(f"  ✗ {response['status']} - Error: {response.get('error', 'Unknown')}")
+            else:
+                self.logger.info(f"  - {response['status']} - Not parsed "
+                                 f"({response.get('content_type') or 'no content type'}, {len(content)} bytes)")
+
+        # Save (batched)
+        self._pending.append(page_data)
+        if len(self._pending) >= self.config.storage.save_batch_size:
+            await self._flush_pending()
+
+    def _enqueue(self, url: str, depth: int):
+        """Add URL to the frontier (dropped and counted if the queue is full)"""
+        # Never block here: workers are the queue's only consumers
+        try:
+            self.queue.put_nowait((depth, -next(self._queue_seq), url))
+        except asyncio.QueueFull:
+            if not self._dropped_links:
+                self.logger.warning(f"Queue full ({MAX_QUEUE_SIZE} URLs), dropping links until it drains")
+            self._dropped_links += 1
+            return
+        self.enqueued.add(url)
+
+    async def _flush_pending(self):
+        """Write buffered pages to storage"""
+        if not self._pending:
+            return
+
+        # Swap buffer first so pages added by other workers meanwhile are kept
+        batch, self._pending = self._pending, []
+        await self.storage.save_pages(batch)
+        if self.visited_exact:
+            # Saved pages are now in the storage's set
+            self.visited_unsaved.difference_update(url_hash(page['url']) for page in batch)
+
+    async def _is_visited(self, url: str, key: int) -> bool:
+        """Check if URL (key = url_hash(url)) has been visited (this run or a previous one)"""
+        if self.visited_exact:
+            return key in self.visited_unsaved or key in self.visited_keys
+
+        if key in self.visited_recent:
+            self.visited_recent.move_to_end(key)
+            return True
+
+        if key not in self.visited_keys:
+            return False
+
+        # Bloom hit: may be a false positive, confirm from storage
+        return await self.storage.has_url(url)
+
+    def _is_claimed(self, key: int) -> bool:
+        """Check (in memory only) if a worker already claimed URL by url_hash key"""
+        if self.visited_exact:
+            return key in self.visited_unsaved or key in self.visited_keys
+        return key in self.visited_recent
+
+    def _mark_visited(self, key: int):
+        """Record URL (by url_hash key) as visited"""
+        if self.visited_exact:
+            self.visited_unsaved.add(key)
+            return
+
+        self.visited_keys.add(key)
+        self.visited_recent[key] = None
+        if len(self.visited_recent) > VISITED_RECENT_SIZE:
+            self.visited_recent.popitem(last=False)
+
+    async def _periodic_progress(self, interval: float = PROGRESS_INTERVAL):
+        """Log progress every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            await self._log_progress()
 
     async def _log_progress(self):
-        """Log progress statistics"""
-        stats = await self.storage.get_stats()
+        """Log progress statistics (from in-memory counters, no storage access)"""
         self.logger.info(
-            f"--- Progress: {self.total_crawled}/{self.config.crawler.max_pages} pages, "
-            f"{len(self.queue)} in queue, {len(self.domain_counters)} domains ---"
+            f"--- Progress: {self.total_crawled}/{self.config.crawler.max_pages} pages "
+            f"({self._successful} ok, {self._errors} errors), "
+            f"{self.queue.qsize()} in queue, {self._dropped_links} links dropped (queue full), "
+            f"{len(self.domain_counters)} domains ---"
         )
 
     async def _log_final_stats(self):
@@ -215,6 +427,8 @@ class TorCrawler:
         self.logger.info(f"Successful: {stats.get('successful', 0)}")
         self.logger.info(f"Errors: {stats.get('errors', 0)}")
         self.logger.info(f"Unique domains: {len(self.domain_counters)}")
+        if self._dropped_links:
+            self.logger.warning(f"Links dropped (queue full): {self._dropped_links}")
 
         if self.config.storage.storage_type == "json":
             self.logger.info(f"Data saved to: {self.config.storage.output_dir}/{self.config.storage.json_filename}")
@@ -229,6 +443,7 @@ class TorCrawler:
             await self.tor_client.close()
 
         if self.storage:
+            await self._flush_pending()
             await self.storage.close()
 
         self.logger.info("Crawler closed")
@@ -3,11 +3,29 @@ HTML parsing and link extraction
 """
 
 from bs4 import BeautifulSoup
-from typing import List, Optional, Set
-from urllib.parse import urljoin, urlparse
+from typing import Collection, List, Optional, Set, Tuple, Union
 import logging
 
-from .utils import normalize_url, is_onion_url, sanitize_html_text
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    SELECTOLAX_AVAILABLE = False
+
+try:
+    import lxml  # noqa: F401
+    BS4_FEATURES = 'lxml'
+except ImportError:
+    BS4_FEATURES = 'html.parser'
+
+from .utils import ONION_URL_RE, canonicalize_url, extract_domain, normalize_urls, sanitize_html_text
+
+# Meta tags to extract: name -> max length
+META_FIELDS = {
+    'description': 300,
+    'keywords': 200,
+    'author': 100,
+}
 
 
 class HTMLParser:
@@ -15,38 +33,59 @@ class HTMLParser:
     Parses HTML pages and extracts .onion links
     """
 
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    def __init__(self, logger: Optional[logging.Logger] = None, use_selectolax: bool = True):
         self.logger = logger or logging.getLogger(__name__)
+        # selectolax (C parser) when installed, BeautifulSoup otherwise
+        self.use_selectolax = use_selectolax and SELECTOLAX_AVAILABLE
 
-    def parse(self, html: str, base_url: str) -> dict:
+    def parse(self, html: Union[str, bytes], base_url: str, charset: Optional[str] = None) -> dict:
         """
         Parse HTML and return structured data
 
         Args:
-            html: HTML content
+            html: HTML content (raw bytes are decoded by the parser itself)
             base_url: Page URL (for link normalization)
+            charset: Encoding of html bytes from Content-Type (None = detect)
 
         Returns:
             Dict containing:
                 - title: str - page title
-                - links: List[str] - discovered links
+                - links: List[str] - discovered links (canonical, see canonicalize_url)
                 - text_preview: str - text preview
                 - meta: dict - meta information
         """
         try:
-            soup = BeautifulSoup(html, 'html.parser')
-
-            # Extract title
-            title = self._extract_title(soup)
-
-            # Extract links
-            links = self._extract_links(soup, base_url)
-
-            # Extract text preview
-            text_preview = self._extract_text_preview(soup)
-
-            # Meta information
-            meta = self._extract_meta(soup)
+            if self.use_selectolax:
+                if isinstance(html, bytes) and charset and charset.lower() not in ('utf-8', 'utf8'):
+                    # selectolax only detects encodings from the document itself
+                    try:
+                        html = html.decode(charset, 'replace')
+                    except LookupError:
+                        pass
+                tree = SelectolaxParser(html)
+                # One C-level traversal for every tag of interest
+                tags = (
+                    (node.tag, node.attributes, node.text)
+                    for node in tree.css('title, h1, a[href], meta[name]')
+                )
+                title, links, meta = self._extract_fields(tags, base_url)
+
+                # Text preview (without script and style contents)
+                tree.strip_tags(['script', 'style'])
+                text = tree.root.text() if tree.root else ''
+                text_preview = sanitize_html_text(text, max_length=500)
+
+            else:
+                if isinstance(html, bytes):
+                    soup = BeautifulSoup(html, BS4_FEATURES, from_encoding=charset)
+                else:
+                    soup = BeautifulSoup(html, BS4_FEATURES)
+                tags = (
+                    (tag.name, tag.attrs, tag.get_text)
+                    for tag in soup.find_all(['title', 'h1', 'a', 'meta'])
+                )
+                title, links, meta = self._extract_fields(tags, base_url)
+                text_preview = self._extract_text_preview(soup)
 
             return {
                 'title': title,
@@ -64,43 +103,58 @@ class HTMLParser:
                 'meta': {}
             }
 
-    def _extract_title(self, soup: BeautifulSoup) -> str:
-        """Extract page title"""
-        title_tag = soup.find('title')
-        if title_tag:
-            return sanitize_html_text(title_tag.get_text(), max_length=200)
-
-        # Try h1 if title is missing
-        h1_tag = soup.find('h1')
-        if h1_tag:
-            return sanitize_html_text(h1_tag.get_text(), max_length=200)
-
-        return "No title"
-
-    def _extract_links(self, soup: BeautifulSoup, base_url: str) -> List[str]:
+    def _extract_fields(self, tags, base_url: str) -> Tuple[str, List[str], dict]:
         """
-        Extract all links from page
+        Extract title, links and meta information in a single pass
+
+        Args:
+            tags: (tag name, attributes, text getter) tuples in document order
+            base_url: Page URL (for link normalization)
 
         Returns:
-            List of normalized URLs
+            (title, canonical links, meta) - title falls back to the first h1
         """
-        links: Set[str] = set()
+        title_text = h1_text = None
+        hrefs: Set[str] = set()  # Raw hrefs: repeated links are normalized once
+        meta = {}
+        seen_meta: Set[str] = set()
+
+        for name, attrs, get_text in tags:
+            if name == 'a':
+                if 'href' not in attrs:
+                    continue
+                hrefs.add(attrs['href'] or '')
 
-        # Find all <a href="..."> tags
-        for tag in soup.find_all('a', href=True):
-            href = tag['href']
+            elif name == 'meta':
+                # Only the first tag of each name counts
+                meta_name = attrs.get('name')
+                if meta_name in META_FIELDS and meta_name not in seen_meta:
+                    seen_meta.add(meta_name)
+                    content = attrs.get('content')
+                    if content:
+                        meta[meta_name] = sanitize_html_text(content, max_length=META_FIELDS[meta_name])
 
-            # Normalize URL
-            normalized = normalize_url(href, base_url)
-            if normalized:
-                links.add(normalized)
+            elif name == 'title':
+                if title_text is None:
+                    title_text = get_text()
 
-        return list(links)
+            elif name == 'h1':
+                if h1_text is None:
+                    h1_text = get_text()
+
+        if title_text is None:
+            title_text = h1_text
+        title = sanitize_html_text(title_text, max_length=200) if title_text is not None else "No title"
+
+        # Canonical forms are what pages are stored and queued under
+        links = {canonicalize_url(link) for link in normalize_urls(hrefs, base_url) if link}
+
+        return title, list(links), meta
 
     def filter_onion_links(
         self,
         links: List[str],
-        allowed_domains: Optional[List[str]] = None,
+        allowed_domains: Optional[Collection[str]] = None,
         follow_external: bool = True,
         base_domain: Optional[str] = None
     ) -> List[str]:
@@ -109,7 +163,7 @@ class HTMLParser:
 
         Args:
             links: List of URLs
-            allowed_domains: List of allowed .onion domains (None = all)
+            allowed_domains: Allowed .onion domains in lowercase, preferably a set (None/empty = all)
             follow_external: Whether to allow other .onion domains
             base_domain: Source domain (if follow_external=False, only this is allowed)
 
@@ -117,23 +171,26 @@ class HTMLParser:
             Filtered list of .onion URLs
         """
         filtered = []
+        only_base = not follow_external and base_domain
+        check_domain = bool(allowed_domains) or only_base
 
         for link in links:
-            # Check that it's .onion
-            if not is_onion_url(link):
+            if not ONION_URL_RE.match(link):
+                continue
+            if not check_domain:
+                filtered.append(link)
                 continue
 
+            # Lowercased and interned once per URL by extract_domain
+            domain = extract_domain(link)
+
             # If allowed_domains defined, check that domain is in list
-            if allowed_domains:
-                domain = urlparse(link).hostname
-                if domain not in allowed_domains:
-                    continue
+            if allowed_domains and domain not in allowed_domains:
+                continue
 
             # If not following external and domain differs
-            if not follow_external and base_domain:
-                domain = urlparse(link).hostname
-                if domain != base_domain:
-                    continue
+            if only_base and domain != base_domain:
+                continue
 
             filtered.append(link)
 
@@ -148,24 +205,3 @@ class HTMLParser:
         # Get body text
         text = soup.get_text()
         return sanitize_html_text(text, max_length=max_length)
-
-    def _extract_meta(self, soup: BeautifulSoup) -> dict:
-        """Extract meta information (description, keywords, etc.)"""
-        meta = {}
-
-        # Meta description
-        desc_tag = soup.find('meta', attrs={'name': 'description'})
-        if desc_tag and desc_tag.get('content'):
-            meta['description'] = sanitize_html_text(desc_tag['content'], max_length=300)
-
-        # Meta keywords
-        keywords_tag = soup.find('meta', attrs={'name': 'keywords'})
-        if keywords_tag and keywords_tag.get('content'):
-            meta['keywords'] = sanitize_html_text(keywords_tag['content'], max_length=200)
-
-        # Meta author
-        author_tag = soup.find('meta', attrs={'name': 'author'})
-        if author_tag and author_tag.get('content'):
-            meta['author'] = sanitize_html_text(author_tag['content'], max_length=100)
-
-        return meta
@@ -3,7 +3,9 @@ Abstract storage class
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from ..utils import format_timestamp
 
 
 class BaseStorage(ABC):
@@ -27,7 +29,8 @@ class BaseStorage(ABC):
                 - status: int
                 - title: str
                 - depth: int
-                - timestamp: str
+                - timestamp_ns: int - UTC epoch nanoseconds
+                  (or timestamp: str - preformatted ISO 8601)
                 - links: List[str]
                 - text_preview: str
                 - meta: dict
@@ -35,9 +38,46 @@ class BaseStorage(ABC):
         """
         pass
 
+    async def save_pages(self, pages: List[Dict[str, Any]]):
+        """
+        Save a batch of pages (same format as save_page)
+
+        Backends should override this to write the batch in one operation.
+        """
+        for page_data in pages:
+            await self.save_page(page_data)
+
+    @staticmethod
+    def _page_timestamp(page_data: Dict[str, Any]) -> str:
+        """Return page timestamp as ISO 8601 string"""
+        if 'timestamp_ns' in page_data:
+            return format_timestamp(page_data['timestamp_ns'])
+        return page_data.get('timestamp', '')
+
+    @abstractmethod
+    async def get_visited_hashes(self) -> Iterable[int]:
+        """
+        Return url_hash values of all visited URLs
+
+        May return the backend's internal set (callers must not modify it)
+        or a one-shot iterator streaming from storage.
+        """
+        pass
+
+    def get_visited_set(self) -> Optional[Set[int]]:
+        """
+        Return the backend's live set of saved url_hash values, or None
+
+        Backends that keep every saved URL in memory anyway return their
+        set so the crawler can look keys up in it instead of building its
+        own filter. Callers must not modify it; it changes only as pages
+        are saved, so has_url stays exact.
+        """
+        return None
+
     @abstractmethod
-    async def get_visited_urls(self) -> set:
-        """Return all visited URLs"""
+    async def has_url(self, url: str) -> bool:
+        """Return True if url has already been stored"""
         pass
 
     @abstractmethod
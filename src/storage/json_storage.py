@@ -2,13 +2,46 @@
 JSON-based storage (NDJSON format)
 """
 
+import asyncio
 import json
+import mmap
 import os
+import re
 from pathlib import Path
-from typing import Dict, Any, Set, Optional
+from typing import Dict, Any, List, Set, Optional
 import logging
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 from .base import BaseStorage
+from ..utils import url_hash
+
+# Maximum number of queued records coalesced into one write
+WRITE_BATCH_SIZE = 64
+
+# Fields needed on resume, matched in raw lines without parsing the whole
+# record. "url" is the first key of every record; quotes inside string
+# values are escaped, so these can't match text inside other fields.
+URL_FIELD_RE = re.compile(rb'"url"\s*:\s*"([^"\\]*)"')
+ERROR_NULL_RE = re.compile(rb'"error"\s*:\s*null')
+
+
+def _dumps_line(record: Dict[str, Any]) -> bytes:
+    """Serialize record as one UTF-8 NDJSON line"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(record) + b'\n'
+    return json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _loads_line(line: bytes) -> Any:
+    """Deserialize one NDJSON line (raises ValueError if invalid)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(line)
+    return json.loads(line)
 
 
 class JSONStorage(BaseStorage):
@@ -21,12 +54,13 @@ class JSONStorage(BaseStorage):
         self.output_dir = Path(output_dir)
         self.filepath = self.output_dir / filename
         self.logger = logger or logging.getLogger(__name__)
-        self._visited_urls: Set[str] = set()
-        self._stats = {
-            'total_pages': 0,
-            'successful': 0,
-            'errors': 0
-        }
+        self._visited_urls: Set[int] = set()  # url_hash values of saved pages
+        # Statistics (total pages = successful + errors)
+        self._n_ok = 0
+        self._n_err = 0
+        self._file = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
 
     async def initialize(self):
         """Create output directory if it doesn't exist"""
@@ -39,59 +73,141 @@ class JSONStorage(BaseStorage):
         else:
             self.logger.info(f"Creating new file: {self.filepath}")
 
+        # Keep one handle open and write from a background task
+        self._file = open(self.filepath, 'ab')
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def _writer_loop(self):
+        """Append queued records to file, coalescing queued records into one write"""
+        running = True
+        while running:
+            chunks = [await self._write_queue.get()]
+            while len(chunks) < WRITE_BATCH_SIZE:
+                try:
+                    chunks.append(self._write_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            # None is the shutdown sentinel sent by close()
+            if None in chunks:
+                running = False
+                chunks = [chunk for chunk in chunks if chunk is not None]
+
+            try:
+                # Disk I/O runs in a worker thread so it never blocks the event loop;
+                # this task awaits each write, so writes stay in order
+                await asyncio.to_thread(self._write_sync, b''.join(chunks))
+            except Exception as e:
+                self.logger.error(f"Error writing to {self.filepath}: {e}")
+
+    def _write_sync(self, data: bytes):
+        """Append data to file and flush (runs in a worker thread)"""
+        self._file.write(data)
+        self._file.flush()
+
     async def _load_existing_urls(self):
         """Load visited URLs from existing file"""
         try:
-            with open(self.filepath, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        data = json.loads(line.strip())
-                        self._visited_urls.add(data.get('url', ''))
-                        self._stats['total_pages'] += 1
-                        if data.get('error'):
-                            self._stats['errors'] += 1
-                        else:
-                            self._stats['successful'] += 1
-                    except json.JSONDecodeError:
-                        continue
+            with open(self.filepath, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    size = len(mm)
+                    pos = 0
+                    while pos < size:
+                        end = mm.find(b'\n', pos)
+                        if end == -1:
+                            end = size
+                        self._load_line(mm, pos, end)
+                        pos = end + 1
 
             self.logger.info(f"Loaded {len(self._visited_urls)} previously crawled pages")
         except Exception as e:
             self.logger.error(f"Error loading previous URLs: {e}")
 
+    def _load_line(self, mm: mmap.mmap, start: int, end: int):
+        """Record url and error status of the NDJSON line mm[start:end]"""
+        match = URL_FIELD_RE.search(mm, start, end)
+        if match and ERROR_NULL_RE.search(mm, match.end(), end):
+            # Common case: plain URL, no error
+            url = match.group(1).decode('utf-8', 'replace')
+            error = None
+        else:
+            # Escaped URL or error set: parse the whole record
+            try:
+                data = _loads_line(mm[start:end])
+            except ValueError:
+                return
+            url = data.get('url', '')
+            error = data.get('error')
+
+        self._visited_urls.add(url_hash(url))
+        if error:
+            self._n_err += 1
+        else:
+            self._n_ok += 1
+
     async def save_page(self, page_data: Dict[str, Any]):
         """Save page to NDJSON file"""
+        await self.save_pages([page_data])
+
+    async def save_pages(self, pages: List[Dict[str, Any]]):
+        """Queue pages for the background writer"""
         try:
-            # Add to visited set
-            self._visited_urls.add(page_data['url'])
+            lines = []
+            for page_data in pages:
+                # Add to visited set
+                self._visited_urls.add(url_hash(page_data['url']))
+
+                # Update stats
+                if page_data.get('error'):
+                    self._n_err += 1
+                else:
+                    self._n_ok += 1
 
-            # Update stats
-            self._stats['total_pages'] += 1
-            if page_data.get('error'):
-                self._stats['errors'] += 1
-            else:
-                self._stats['successful'] += 1
+                record = dict(page_data, timestamp=self._page_timestamp(page_data))
+                record.pop('timestamp_ns', None)
+                lines.append(_dumps_line(record))
 
-            # Write to file (append mode)
-            with open(self.filepath, 'a', encoding='utf-8') as f:
-                json.dump(page_data, f, ensure_ascii=False)
-                f.write('\n')
+            await self._write_queue.put(b''.join(lines))
 
         except Exception as e:
-            self.logger.error(f"Error saving page {page_data.get('url', 'unknown')}: {e}")
+            self.logger.error(f"Error saving {len(pages)} pages: {e}")
 
-    async def get_visited_urls(self) -> set:
-        """Return all visited URLs"""
-        return self._visited_urls.copy()
+    async def get_visited_hashes(self) -> Set[int]:
+        """Return url_hash values of all visited URLs (live set, don't modify)"""
+        return self._visited_urls
+
+    def get_visited_set(self) -> Set[int]:
+        """Return url_hash values of saved URLs (live set, don't modify)"""
+        return self._visited_urls
+
+    async def has_url(self, url: str) -> bool:
+        """Check if URL has been saved"""
+        return url_hash(url) in self._visited_urls
 
     async def close(self):
-        """Nothing to do for NDJSON"""
+        """Flush pending writes and close file"""
+        if self._writer_task:
+            await self._write_queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
         self.logger.info(f"JSON storage complete: {self.filepath}")
-        self.logger.info(f"Statistics: {self._stats}")
+        self.logger.info(f"Statistics: {await self.get_stats()}")
 
     async def get_stats(self) -> Dict[str, Any]:
         """Return statistics"""
-        return self._stats.copy()
+        return {
+            'total_pages': self._n_ok + self._n_err,
+            'successful': self._n_ok,
+            'errors': self._n_err
+        }
 
     def load_all_pages(self) -> list:
         """
@@ -102,12 +218,11 @@ class JSONStorage(BaseStorage):
         """
         pages = []
         try:
-            with open(self.filepath, 'r', encoding='utf-8') as f:
+            with open(self.filepath, 'rb') as f:
                 for line in f:
                     try:
-                        data = json.loads(line.strip())
-                        pages.append(data)
-                    except json.JSONDecodeError:
+                        pages.append(_loads_line(line))
+                    except ValueError:
                         continue
         except FileNotFoundError:
             pass
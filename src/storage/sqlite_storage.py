@@ -2,13 +2,38 @@
 SQLite-based storage
 """
 
+import asyncio
 import sqlite3
 import json
+import threading
 from pathlib import Path
-from typing import Dict, Any, Set, Optional
+from typing import Dict, Any, Iterator, List, Optional, Set
 import logging
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 from .base import BaseStorage
+from ..utils import url_hash
+
+# Rows fetched per round trip by query_pages
+QUERY_BATCH_SIZE = 1000
+
+# Page size for new databases (bytes)
+PAGE_SIZE = 32768
+
+# URLs looked up per 'SELECT ... IN (...)' when resolving link URL ids
+URL_LOOKUP_BATCH_SIZE = 500
+
+
+def _dumps_meta(meta: Dict[str, Any]) -> str:
+    """Serialize meta dict as JSON text (meta column stays TEXT for json_extract)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(meta).decode('utf-8')
+    return json.dumps(meta)
 
 
 class SQLiteStorage(BaseStorage):
@@ -16,25 +41,76 @@ class SQLiteStorage(BaseStorage):
     Stores crawled pages in SQLite database
     """
 
+    # Upsert keeps the row (and its id) instead of REPLACE's delete + insert
+    INSERT_PAGE_SQL = '''
+        INSERT INTO pages
+        (url, status, title, depth, timestamp, text_preview, error, meta)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            status = excluded.status,
+            title = excluded.title,
+            depth = excluded.depth,
+            timestamp = excluded.timestamp,
+            text_preview = excluded.text_preview,
+            error = excluded.error,
+            meta = excluded.meta
+    '''
+
+    INSERT_URL_SQL = 'INSERT OR IGNORE INTO urls (url) VALUES (?)'
+
+    INSERT_LINK_SQL = '''
+        INSERT OR IGNORE INTO link_edges (source_id, target_id)
+        VALUES (?, ?)
+    '''
+
+    # Link endpoints are stored once in urls and referenced by integer id.
+    # link_edges has a composite key without a rowid: one B-tree that also
+    # serves lookups by source, and a repeated link is stored once.
+    CREATE_LINK_TABLES_SQL = (
+        '''
+        CREATE TABLE IF NOT EXISTS urls (
+            id INTEGER PRIMARY KEY,
+            url TEXT UNIQUE NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS link_edges (
+            source_id INTEGER NOT NULL REFERENCES urls(id),
+            target_id INTEGER NOT NULL REFERENCES urls(id),
+            PRIMARY KEY (source_id, target_id)
+        ) WITHOUT ROWID
+        ''',
+        # Same columns as the former links table, so existing queries keep working
+        '''
+        CREATE VIEW IF NOT EXISTS links AS
+        SELECT s.url AS source_url, t.url AS target_url
+        FROM link_edges
+        JOIN urls AS s ON s.id = link_edges.source_id
+        JOIN urls AS t ON t.id = link_edges.target_id
+        ''',
+    )
+
     def __init__(self, output_dir: str, filename: str, logger: Optional[logging.Logger] = None):
         self.output_dir = Path(output_dir)
         self.filepath = self.output_dir / filename
         self.logger = logger or logging.getLogger(__name__)
         self.conn: Optional[sqlite3.Connection] = None
-        self._visited_urls: Set[str] = set()
+        # Database calls run in worker threads (asyncio.to_thread) so commits
+        # don't stall the event loop; the lock serializes the shared connection
+        self._lock = threading.Lock()
 
     async def initialize(self):
         """Create database and tables"""
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
-        self.conn = sqlite3.connect(str(self.filepath))
+        self.conn = sqlite3.connect(str(self.filepath), check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
 
         # Create tables
         self._create_tables()
 
-        # Load visited URLs
-        await self._load_visited_urls()
+        count = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        self.logger.info(f"Database contains {count} previously crawled pages")
 
         self.logger.info(f"SQLite database initialized: {self.filepath}")
 
@@ -42,6 +118,21 @@ class SQLiteStorage(BaseStorage):
         """Create database tables"""
         cursor = self.conn.cursor()
 
+        # Larger pages keep a row (text_preview + meta) on one page. page_size
+        # only applies to an empty database and can't change once it is in WAL
+        # mode, so existing databases keep theirs (no VACUUM on every start)
+        cursor.execute(f'PRAGMA page_size={PAGE_SIZE}')
+
+        # WAL journal: one fsync per checkpoint instead of per commit, and
+        # readers don't block the writer (NORMAL sync is crash-safe in WAL)
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA cache_size=-32768')  # 32 MiB
+        cursor.execute('PRAGMA mmap_size=268435456')  # 256 MiB
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.execute('PRAGMA wal_autocheckpoint=250')  # pages, ~8 MiB WAL at 32 KiB
+        cursor.execute('PRAGMA trusted_schema=OFF')
+
         # Main pages table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS pages (
@@ -58,106 +149,169 @@ class SQLiteStorage(BaseStorage):
             )
         ''')
 
-        # Links table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS links (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_url TEXT NOT NULL,
-                target_url TEXT NOT NULL,
-                FOREIGN KEY (source_url) REFERENCES pages(url)
-            )
-        ''')
+        # Links (urls + link_edges tables, links view)
+        self._migrate_links_table(cursor)
+        for sql in self.CREATE_LINK_TABLES_SQL:
+            cursor.execute(sql)
 
-        # Indexes for performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url)')
+        # Indexes for performance (pages.url is indexed by its UNIQUE constraint;
+        # older databases also had a duplicate idx_pages_url)
+        cursor.execute('DROP INDEX IF EXISTS idx_pages_url')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_pages_status ON pages(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_links_source ON links(source_url)')
 
         self.conn.commit()
 
-    async def _load_visited_urls(self):
-        """Load visited URLs from database"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT url FROM pages')
-        self._visited_urls = {row[0] for row in cursor.fetchall()}
-        self.logger.info(f"Loaded {len(self._visited_urls)} previously crawled pages")
+    def _migrate_links_table(self, cursor: sqlite3.Cursor):
+        """Move links from an old links table (URL text columns) to urls + link_edges"""
+        row = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'links'"
+        ).fetchone()
+        if row is None:
+            return
+
+        self.logger.info("Migrating links table to url ids")
+        with self.conn:
+            cursor.execute('BEGIN')
+            cursor.execute('ALTER TABLE links RENAME TO links_old')
+            for sql in self.CREATE_LINK_TABLES_SQL:
+                cursor.execute(sql)
+            cursor.execute('''
+                INSERT OR IGNORE INTO urls (url)
+                SELECT source_url FROM links_old UNION SELECT target_url FROM links_old
+            ''')
+            cursor.execute('''
+                INSERT OR IGNORE INTO link_edges (source_id, target_id)
+                SELECT s.id, t.id
+                FROM links_old
+                JOIN urls AS s ON s.url = links_old.source_url
+                JOIN urls AS t ON t.url = links_old.target_url
+            ''')
+            cursor.execute('DROP TABLE links_old')
 
     async def save_page(self, page_data: Dict[str, Any]):
         """Save page to SQLite database"""
-        try:
-            cursor = self.conn.cursor()
+        await self.save_pages([page_data])
 
-            # Save main page
-            cursor.execute('''
-                INSERT OR REPLACE INTO pages
-                (url, status, title, depth, timestamp, text_preview, error, meta)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                page_data['url'],
-                page_data.get('status', 0),
-                page_data.get('title', ''),
-                page_data.get('depth', 0),
-                page_data.get('timestamp', ''),
-                page_data.get('text_preview', ''),
-                page_data.get('error'),
-                json.dumps(page_data.get('meta', {}))
-            ))
-
-            # Save links
-            for link in page_data.get('links', []):
-                cursor.execute('''
-                    INSERT INTO links (source_url, target_url)
-                    VALUES (?, ?)
-                ''', (page_data['url'], link))
-
-            self.conn.commit()
-
-            # Add to visited set
-            self._visited_urls.add(page_data['url'])
+    async def save_pages(self, pages: List[Dict[str, Any]]):
+        """Save pages to SQLite database in one transaction"""
+        try:
+            await asyncio.to_thread(self._save_pages_sync, pages)
 
         except sqlite3.IntegrityError as e:
-            self.logger.debug(f"Page already in database: {page_data['url']}")
+            self.logger.debug(f"Pages already in database: {e}")
         except Exception as e:
-            self.logger.error(f"Error saving page {page_data.get('url', 'unknown')}: {e}")
+            self.logger.error(f"Error saving {len(pages)} pages: {e}")
+
+    def _save_pages_sync(self, pages: List[Dict[str, Any]]):
+        """Insert pages in one transaction (runs in a worker thread)"""
+        # Connection context commits on success, rolls back on error
+        with self._lock, self.conn:
+            self._insert_pages(pages)
+
+    def _insert_pages(self, pages: List[Dict[str, Any]]):
+        """Insert pages and their links (caller handles the transaction)"""
+        cursor = self.conn.cursor()
+
+        # Save main pages
+        cursor.executemany(self.INSERT_PAGE_SQL, [(
+            page_data['url'],
+            page_data.get('status', 0),
+            page_data.get('title', ''),
+            page_data.get('depth', 0),
+            self._page_timestamp(page_data),
+            page_data.get('text_preview', ''),
+            page_data.get('error'),
+            _dumps_meta(page_data.get('meta', {}))
+        ) for page_data in pages])
+
+        # Save links (as url ids)
+        links = [
+            (page_data['url'], link)
+            for page_data in pages
+            for link in page_data.get('links', [])
+        ]
+        if links:
+            url_ids = self._url_ids(cursor, {url for link in links for url in link})
+            cursor.executemany(self.INSERT_LINK_SQL, [
+                (url_ids[source], url_ids[target]) for source, target in links
+            ])
+
+    def _url_ids(self, cursor: sqlite3.Cursor, urls: Set[str]) -> Dict[str, int]:
+        """Insert missing urls and return url -> id for all of them"""
+        cursor.executemany(self.INSERT_URL_SQL, [(url,) for url in urls])
+
+        url_ids = {}
+        pending = list(urls)
+        for start in range(0, len(pending), URL_LOOKUP_BATCH_SIZE):
+            batch = pending[start:start + URL_LOOKUP_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            cursor.execute(f'SELECT url, id FROM urls WHERE url IN ({placeholders})', batch)
+            url_ids.update(cursor.fetchall())
+        return url_ids
+
+    async def get_visited_hashes(self) -> Iterator[int]:
+        """Return url_hash values of all visited URLs (streamed from the database)"""
+        cursor = self.conn.execute('SELECT url FROM pages')
+        return (url_hash(row[0]) for row in cursor)
+
+    async def has_url(self, url: str) -> bool:
+        """
+        Check if URL has been saved
+
+        No URLs are kept in memory: the crawler's Bloom filter answers most
+        lookups and only its hits reach this indexed query.
+        """
+        return await asyncio.to_thread(self._has_url_sync, url)
 
-    async def get_visited_urls(self) -> set:
-        """Return all visited URLs"""
-        return self._visited_urls.copy()
+    def _has_url_sync(self, url: str) -> bool:
+        with self._lock:
+            cursor = self.conn.execute('SELECT 1 FROM pages WHERE url = ? LIMIT 1', (url,))
+            return cursor.fetchone() is not None
 
     async def close(self):
         """Close database connection"""
         if self.conn:
-            self.conn.close()
+            with self._lock:
+                # Refresh query planner statistics that drifted during the crawl
+                try:
+                    self.conn.execute('PRAGMA optimize')
+                except sqlite3.Error as e:
+                    self.logger.debug(f"PRAGMA optimize failed: {e}")
+                self.conn.close()
             self.logger.info(f"SQLite connection closed: {self.filepath}")
 
     async def get_stats(self) -> Dict[str, Any]:
         """Return statistics"""
-        cursor = self.conn.cursor()
+        return await asyncio.to_thread(self._get_stats_sync)
+
+    def _get_stats_sync(self) -> Dict[str, Any]:
+        with self._lock:
+            cursor = self.conn.cursor()
 
-        # Total count
-        cursor.execute('SELECT COUNT(*) FROM pages')
-        total = cursor.fetchone()[0]
+            # Total count
+            cursor.execute('SELECT COUNT(*) FROM pages')
+            total = cursor.fetchone()[0]
 
-        # Successful
-        cursor.execute('SELECT COUNT(*) FROM pages WHERE error IS NULL')
-        successful = cursor.fetchone()[0]
+            # Successful
+            cursor.execute('SELECT COUNT(*) FROM pages WHERE error IS NULL')
+            successful = cursor.fetchone()[0]
 
-        # Errors
-        cursor.execute('SELECT COUNT(*) FROM pages WHERE error IS NOT NULL')
-        errors = cursor.fetchone()[0]
+            # Errors
+            cursor.execute('SELECT COUNT(*) FROM pages WHERE error IS NOT NULL')
+            errors = cursor.fetchone()[0]
 
-        # Links
-        cursor.execute('SELECT COUNT(*) FROM links')
-        total_links = cursor.fetchone()[0]
+            # Links
+            cursor.execute('SELECT COUNT(*) FROM link_edges')
+            total_links = cursor.fetchone()[0]
 
-        return {
-            'total_pages': total,
-            'successful': successful,
-            'errors': errors,
-            'total_links': total_links
-        }
+            return {
+                'total_pages': total,
+                'successful': successful,
+                'errors': errors,
+                'total_links': total_links
+            }
 
-    def query_pages(self, where_clause: str = "1=1", params: tuple = ()) -> list:
+    def query_pages(self, where_clause: str = "1=1", params: tuple = ()) -> Iterator[Dict[str, Any]]:
         """
         Helper function: Query pages from database
 
@@ -166,13 +320,33 @@ class SQLiteStorage(BaseStorage):
             params: Parameters for prepared statement
 
         Returns:
-            List of dictionaries
+            Iterator of dictionaries, fetched in batches (use list() for a list)
+
+        The query runs on its own read-only connection, so it never shares
+        the writer's connection or lock. In WAL mode it reads the snapshot
+        taken when query_pages is called, however slowly the iterator is
+        consumed; pages saved meanwhile are not included. An unfinished
+        iterator keeps its connection open and holds back WAL checkpoints
+        until it is exhausted or closed (close()).
         """
-        cursor = self.conn.cursor()
-        cursor.execute(f'SELECT * FROM pages WHERE {where_clause}', params)
-
-        pages = []
-        for row in cursor.fetchall():
-            pages.append(dict(row))
-
-        return pages
+        conn = sqlite3.connect(f'{self.filepath.resolve().as_uri()}?mode=ro', uri=True)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(f'SELECT * FROM pages WHERE {where_clause}', params)
+        except Exception:
+            conn.close()
+            raise
+        return self._iter_rows(conn, cursor)
+
+    @staticmethod
+    def _iter_rows(conn: sqlite3.Connection, cursor: sqlite3.Cursor) -> Iterator[Dict[str, Any]]:
+        """Yield cursor rows as dictionaries in batches, then close conn"""
+        try:
+            while True:
+                rows = cursor.fetchmany(QUERY_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
@@ -4,7 +4,9 @@ Tor connection management and SOCKS5 proxy integration
 
 import aiohttp
 import asyncio
-from typing import Optional, Dict, Any
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
 from aiohttp_socks import ProxyConnector
 import logging
 
@@ -15,8 +17,21 @@ try:
 except ImportError:
     STEM_AVAILABLE = False
 
-from .config import TorConfig
-from .utils import setup_logger
+from .config import TorConfig, CONFIG_CACHE_DIR
+from .utils import setup_logger, extract_domain
+
+# Seconds an idle connection is kept open for reuse (avoids new SOCKS
+# handshakes and circuit setup for consecutive requests to the same site)
+KEEPALIVE_TIMEOUT = 30
+
+# Bytes requested per read when streaming a response body
+READ_CHUNK_SIZE = 65536
+
+# Default number of parallel requests per host in fetch_many
+PER_HOST_LIMIT = 4
+
+# Seconds a successful Tor check is trusted before verify_on_start checks again
+VERIFY_TTL = 3600
 
 
 class TorClient:
@@ -24,11 +39,13 @@ class TorClient:
     Manages Tor connection and HTTP requests via SOCKS5 proxy
     """
 
-    def __init__(self, config: TorConfig, logger: Optional[logging.Logger] = None):
+    def __init__(self, config: TorConfig, logger: Optional[logging.Logger] = None, max_connections: int = 100):
         self.config = config
         self.logger = logger or setup_logger(__name__)
+        self.max_connections = max_connections  # Connection pool size
         self.session: Optional[aiohttp.ClientSession] = None
         self._connector: Optional[ProxyConnector] = None
+        self._timeouts: Dict[int, aiohttp.ClientTimeout] = {}  # Seconds -> reusable timeout
 
     async def __aenter__(self):
         """Async context manager entry"""
@@ -46,18 +63,42 @@ class TorClient:
         self.logger.info(f"Initializing Tor connection: {proxy_url}")
 
         # Create SOCKS5 proxy connector
-        self._connector = ProxyConnector.from_url(proxy_url)
+        # (pool sized to the number of parallel requests, idle connections kept for reuse)
+        self._connector = ProxyConnector.from_url(
+            proxy_url,
+            limit=self.max_connections,
+            keepalive_timeout=KEEPALIVE_TIMEOUT
+        )
 
-        # Create aiohttp session
+        # Create aiohttp session (reused for every request until close(),
+        # keep-alive requested explicitly so pooled connections stay open)
         timeout = aiohttp.ClientTimeout(total=60, connect=30, sock_connect=30)
         self.session = aiohttp.ClientSession(
             connector=self._connector,
-            timeout=timeout
+            timeout=timeout,
+            headers={'Connection': 'keep-alive'}
         )
 
+        if not self.config.verify_on_start:
+            return
+
+        # Skip the check (a full Tor round trip) if this proxy passed it recently
+        marker = self._verified_marker()
+        try:
+            if time.time() - marker.stat().st_mtime < VERIFY_TTL:
+                self.logger.info("✓ Tor connection verified recently, skipping check")
+                return
+        except OSError:
+            pass
+
         # Test connection
         try:
-            await self._test_connection()
+            if await self._test_connection():
+                try:
+                    CONFIG_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                    marker.touch()
+                except OSError:
+                    pass
             self.logger.info("✓ Tor connection working")
         except Exception as e:
             self.logger.error(f"✗ Tor connection test failed: {e}")
@@ -66,8 +107,12 @@ class TorClient:
                 f"Error: {e}"
             )
 
-    async def _test_connection(self):
-        """Test Tor connection functionality"""
+    def _verified_marker(self) -> Path:
+        """Path of the file whose mtime records the last successful check of this proxy"""
+        return CONFIG_CACHE_DIR / f"last_verified-{self.config.proxy_host}-{self.config.proxy_port}"
+
+    async def _test_connection(self) -> bool:
+        """Test Tor connection functionality (True if traffic is confirmed to go through Tor)"""
         # Try simple request (may fail if no internet, but checks proxy)
         try:
             async with self.session.get(
@@ -78,6 +123,7 @@ class TorClient:
                     data = await response.json()
                     if data.get('IsTor', False):
                         self.logger.info(f"✓ Tor connection verified. IP: {data.get('IP', 'unknown')}")
+                        return True
                     else:
                         self.logger.warning("⚠ Connection works but not through Tor network!")
         except asyncio.TimeoutError:
@@ -85,48 +131,67 @@ class TorClient:
         except Exception as e:
             # If check.torproject.org doesn't respond, just verify proxy accepts connections
             self.logger.debug(f"Tor test error (may be normal): {e}")
+        return False
 
     async def fetch(
         self,
         url: str,
         headers: Optional[Dict[str, str]] = None,
         timeout: int = 30,
-        allow_redirects: bool = True
+        allow_redirects: bool = True,
+        max_bytes: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Fetch page through Tor network
 
+        Args:
+            max_bytes: Read at most this many bytes of the body (None = all)
+
         Returns:
             Dict containing:
                 - url: str - final URL (after redirects)
                 - status: int - HTTP status code
                 - headers: dict - response headers
-                - content: str - HTML content
+                - content_type: str - MIME type ('' if not sent)
+                - charset: Optional[str] - charset from Content-Type
+                - content: bytes - raw response body
+                - truncated: bool - whether body was cut at max_bytes
                 - error: Optional[str] - error message if failed
         """
         if not self.session:
             raise RuntimeError("TorClient not initialized. Use async with context.")
 
+        client_timeout = self._timeouts.get(timeout)
+        if client_timeout is None:
+            client_timeout = self._timeouts[timeout] = aiohttp.ClientTimeout(total=timeout)
+
         try:
             async with self.session.get(
                 url,
                 headers=headers,
-                timeout=aiohttp.ClientTimeout(total=timeout),
+                timeout=client_timeout,
                 allow_redirects=allow_redirects,
                 ssl=False  # No SSL validation for .onion sites
             ) as response:
-                # Read content
+                # Read raw body; the HTML parser decodes it
+                truncated = False
                 try:
-                    content = await response.text(errors='ignore')
+                    if max_bytes is None:
+                        content = await response.read()
+                    else:
+                        content, truncated = await self._read_capped(response, max_bytes)
                 except Exception as e:
                     self.logger.warning(f"Failed to read content {url}: {e}")
-                    content = ""
+                    content = b''
 
                 return {
                     'url': str(response.url),
                     'status': response.status,
                     'headers': dict(response.headers),
+                    'content_type': response.content_type if 'Content-Type' in response.headers else '',
+                    'charset': response.charset,
                     'content': content,
+                    'truncated': truncated,
                     'error': None
                 }
 
@@ -136,7 +201,10 @@ class TorClient:
                 'url': url,
                 'status': 0,
                 'headers': {},
-                'content': '',
+                'content_type': '',
+                'charset': None,
+                'content': b'',
+                'truncated': False,
                 'error': 'Timeout'
             }
 
@@ -146,7 +214,10 @@ class TorClient:
                 'url': url,
                 'status': 0,
                 'headers': {},
-                'content': '',
+                'content_type': '',
+                'charset': None,
+                'content': b'',
+                'truncated': False,
                 'error': f'ClientError: {str(e)}'
             }
 
@@ -156,10 +227,58 @@ class TorClient:
                 'url': url,
                 'status': 0,
                 'headers': {},
-                'content': '',
+                'content_type': '',
+                'charset': None,
+                'content': b'',
+                'truncated': False,
                 'error': f'Exception: {str(e)}'
             }
 
+    async def fetch_many(
+        self,
+        urls: List[str],
+        per_host_limit: int = PER_HOST_LIMIT,
+        **fetch_kwargs
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch several pages concurrently, at most per_host_limit at a time per host
+
+        Requests to the same host reuse the pooled keep-alive connections,
+        so only the first ones pay for SOCKS and circuit setup.
+
+        Args:
+            urls: URLs to fetch
+            per_host_limit: Maximum parallel requests to one host
+            **fetch_kwargs: Passed to fetch()
+
+        Returns:
+            fetch() results in the same order as urls
+        """
+        semaphores: Dict[Optional[str], asyncio.Semaphore] = {}
+        for url in urls:
+            host = extract_domain(url)
+            if host not in semaphores:
+                semaphores[host] = asyncio.Semaphore(per_host_limit)
+
+        async def fetch_limited(url: str) -> Dict[str, Any]:
+            async with semaphores[extract_domain(url)]:
+                return await self.fetch(url, **fetch_kwargs)
+
+        return await asyncio.gather(*(fetch_limited(url) for url in urls))
+
+    async def _read_capped(self, response: aiohttp.ClientResponse, max_bytes: int) -> Tuple[bytes, bool]:
+        """Stream at most max_bytes of response body; returns (body, truncated)"""
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                # Rest of the body is never downloaded
+                return b''.join(chunks)[:max_bytes], size > max_bytes or not response.content.at_eof()
+
+        return b''.join(chunks), False
+
     async def renew_tor_circuit(self) -> bool:
         """
         Renew Tor circuit to get new IP address (requires stem library)
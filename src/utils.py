@@ -2,10 +2,71 @@
 Utility functions for Tor Crawler
 """
 
+import hashlib
 import logging
 import re
-from urllib.parse import urlparse, urljoin, urldefrag
-from typing import Optional
+import sys
+from functools import lru_cache
+from datetime import datetime, timedelta
+from urllib.parse import urljoin, urlsplit, urlunsplit, SplitResult
+from typing import Iterable, List, Optional
+
+try:
+    import mmh3
+    MMH3_AVAILABLE = True
+except ImportError:
+    MMH3_AVAILABLE = False
+
+
+# http(s) URL on a v2 (16 char) or v3 (56 char) onion address; group 1 is the host
+ONION_URL_RE = re.compile(
+    r'^https?://((?:[a-z0-9-]+\.)*(?:[a-z2-7]{16}|[a-z2-7]{56})\.onion)(?::\d+)?(?:[/?#]|$)',
+    re.IGNORECASE
+)
+
+# Host of an absolute (or scheme-relative) URL with optional userinfo and
+# port; group 1 is the host. IPv6 literals don't match (see extract_domain)
+_URL_HOST_RE = re.compile(
+    r'^(?:[a-z][a-z0-9+.-]*:)?//(?:[^/?#@]*@)?([^/?#@:\[\]]+)(?::\d*)?(?:[/?#]|$)',
+    re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse(url: str) -> SplitResult:
+    """urlsplit(url), memoized: the same links go through several helpers"""
+    return urlsplit(url)
+
+
+class _CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that renders asctime once per second
+
+    Filtered records never reach the formatter, so only emitted records
+    pay for the timestamp; with datefmt at second resolution, records within
+    the same second reuse the localtime + strftime result.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._time_cache = (None, '')  # (epoch second, formatted time)
+
+    def formatTime(self, record: logging.LogRecord, datefmt: Optional[str] = None) -> str:
+        second = int(record.created)
+        cached_second, formatted = self._time_cache
+        if second != cached_second:
+            formatted = super().formatTime(record, datefmt)
+            self._time_cache = (second, formatted)
+        return formatted
+
+
+# Console handler shared by every logger from setup_logger (no level of its
+# own: each logger's level already filters records)
+_LOG_HANDLER = logging.StreamHandler()
+_LOG_HANDLER.setFormatter(_CachedTimeFormatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+))
 
 
 def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
@@ -13,28 +74,19 @@ def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
     logger = logging.getLogger(name)
     logger.setLevel(getattr(logging, level.upper()))
 
-    # Console handler
-    handler = logging.StreamHandler()
-    handler.setLevel(getattr(logging, level.upper()))
+    # Attached once: a second attachment would print every record twice
+    if _LOG_HANDLER not in logger.handlers:
+        logger.addHandler(_LOG_HANDLER)
+    return logger
 
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
-    return logger
+# Longer URLs are rarely repeated; interning them would only grow the intern table
+INTERN_MAX_LENGTH = 200
 
 
-def is_onion_url(url: str) -> bool:
-    """Check if URL is a .onion address"""
-    try:
-        parsed = urlparse(url)
-        return parsed.hostname and parsed.hostname.endswith('.onion')
-    except Exception:
-        return False
+# Memoized (url, base directory) pairs; navigation links repeat on every
+# page of a directory
+NORMALIZE_CACHE_SIZE = 16384
 
 
 def normalize_url(url: str, base_url: Optional[str] = None) -> Optional[str]:
@@ -43,54 +95,280 @@ def normalize_url(url: str, base_url: Optional[str] = None) -> Optional[str]:
     - Remove fragments (#)
     - Convert relative URLs to absolute
     - Remove trailing slash
+
+    Results shorter than INTERN_MAX_LENGTH are interned: the same links
+    recur on many pages and then share one string object. Results are
+    memoized per (url, relevant part of base_url), see normalize_url.cache_info().
     """
     try:
-        # If relative URL and base_url provided
+        # Fast path: absolute http(s) URL with no fragment and no trailing
+        # slash is already normalized (checked before the cache, so these
+        # identity results don't evict useful cache entries)
+        if base_url is None and '#' not in url and not url.endswith('/'):
+            scheme, sep, _ = url.partition('://')
+            if sep and scheme.lower() in ('http', 'https'):
+                return sys.intern(url) if len(url) < INTERN_MAX_LENGTH else url
+
+        if base_url:
+            base_url = _relevant_base(url, base_url, _base_origin(base_url), _base_directory(base_url))
+        return _normalize_url(url, base_url)
+    except Exception:
+        return None
+
+
+def normalize_urls(urls: Iterable[str], base_url: Optional[str] = None) -> List[Optional[str]]:
+    """
+    Normalize a batch of URLs found on the same page (see normalize_url)
+
+    Returns results in the same order as urls. The base URL's origin and
+    directory are derived once for the whole batch.
+    """
+    if not base_url:
+        return [normalize_url(url) for url in urls]
+
+    origin = _base_origin(base_url)
+    directory = _base_directory(base_url)
+    results = []
+    for url in urls:
+        try:
+            results.append(_normalize_url(url, _relevant_base(url, base_url, origin, directory)))
+        except Exception:
+            results.append(None)
+    return results
+
+
+# URL scheme as urlsplit recognizes it ("http:", "mailto:", ...)
+_SCHEME_RE = re.compile(r'[a-z][a-z0-9+.-]*:', re.IGNORECASE)
+
+
+def _relevant_base(url: str, base_url: str, origin: Optional[str], directory: str) -> Optional[str]:
+    """
+    Return the part of base_url that url resolves against
+
+    origin and directory are _base_origin(base_url) and _base_directory(base_url).
+
+    Smaller bases let links shared by many pages share cache entries.
+    """
+    # urljoin first strips leading spaces and control characters and removes
+    # tabs and newlines, which can change what kind of reference it is
+    # (' ' becomes empty, '/\n/x' becomes '//x')
+    if url[:1] <= ' ' or '\t' in url or '\n' in url or '\r' in url:
+        return base_url
+    # Absolute with a host: nothing to resolve (see _is_resolved)
+    if url.startswith(('http://', 'https://')):
+        host_start = url.find('//') + 2
+        if url[host_start:host_start + 1] not in ('', '/', '?', '#') and _is_resolved(url):
+            return None
+        return base_url
+    # Other references with a scheme are resolved against the whole base
+    # ("http:" alone is the base), as are ';params' references
+    if url[:1] == ';' or _SCHEME_RE.match(url):
+        return base_url
+    # Absolute path: only the origin matters (unless the base has no
+    # canonical origin, see _base_origin)
+    if url[:1] == '/' and url[1:2] != '/':
+        return origin or base_url
+    # Empty, query-only and fragment-only references keep the base's last
+    # segment (and query); urljoin also reads the full base for '//'
+    if url[:1] in ('', '?', '#') or url.startswith('//'):
+        return base_url
+    return directory
+
+
+def _is_resolved(url: str) -> bool:
+    """Whether joining would leave url as it is (apart from the fragment)"""
+    # Dot segments are resolved, an empty query or ';params' is dropped,
+    # tabs/newlines are removed and brackets outside an IPv6 host are
+    # rejected by urljoin
+    return ('/.' not in url and not url.endswith('?') and '?#' not in url
+            and ';' not in url and '[' not in url and ']' not in url
+            and '\t' not in url and '\n' not in url and '\r' not in url)
+
+
+def _base_origin(base_url: str) -> Optional[str]:
+    """
+    Cut base_url before its path (scheme://authority)
+
+    Returns None unless the scheme is a lowercase "http" or "https": urljoin
+    lowercases the scheme and resolves other schemes differently, so those
+    bases always go through the full join.
+    """
+    if not base_url.startswith(('http://', 'https://')):
+        return None
+    start = base_url.find('://') + 3
+    end = len(base_url)
+    for sep in '/?#':
+        i = base_url.find(sep, start, end)
+        if i != -1:
+            end = i
+    return base_url[:end]
+
+
+def _base_directory(base_url: str) -> str:
+    """Cut base_url after the last '/' of its path (query and fragment dropped)"""
+    end = len(base_url)
+    for sep in '?#':
+        i = base_url.find(sep, 0, end)
+        if i != -1:
+            end = i
+
+    scheme_end = base_url.find('://', 0, end)
+    path_start = base_url.find('/', scheme_end + 3 if scheme_end != -1 else 0, end)
+    if path_start == -1:
+        return base_url[:end]
+    return base_url[:base_url.rfind('/', path_start, end) + 1]
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_url(url: str, base_url: Optional[str]) -> Optional[str]:
+    """normalize_url minus its fast path and base_url reduction (memoized)"""
+    try:
+        # If relative URL and base_url provided: a plain absolute path is
+        # appended to an http(s) origin, anything else goes through a full join
         if base_url:
-            url = urljoin(base_url, url)
+            if (url[:1] == '/' and url[1:2] != '/' and _is_resolved(url)
+                    and base_url.startswith(('http://', 'https://'))):
+                url = base_url + url  # base_url is the origin here (see _relevant_base)
+            else:
+                url = urljoin(base_url, url)
 
         # Remove fragment
-        url, _ = urldefrag(url)
+        hash_idx = url.find('#')
+        if hash_idx != -1:
+            url = url[:hash_idx]
 
-        # Remove trailing slash (except root)
-        parsed = urlparse(url)
-        if parsed.path and parsed.path != '/' and parsed.path.endswith('/'):
-            url = url.rstrip('/')
+        # Remove one trailing slash, keeping the root path and empty
+        # segments ("scheme://host/" and ".../a//" are left as they are)
+        if url.endswith('/') and '?' not in url and url[-2:-1] != '/':
+            scheme_end = url.find('://')
+            path_start = url.find('/', scheme_end + 3 if scheme_end != -1 else 0)
+            if len(url) - path_start > 1:
+                url = url[:-1]
 
-        return url
+        return sys.intern(url) if len(url) < INTERN_MAX_LENGTH else url
     except Exception:
         return None
 
 
+normalize_url.cache_info = _normalize_url.cache_info
+normalize_url.cache_clear = _normalize_url.cache_clear
+
+
+_DEFAULT_PORTS = {'http': ':80', 'https': ':443'}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonicalize URL so that equivalent variants compare equal:
+    - Lowercase host
+    - Strip default port
+    - Drop fragment
+    - Sort query parameters
+    - Remove one trailing slash like normalize_url (the root path and
+      empty segments are kept)
+
+    The result is interned so repeated URLs share one string object.
+    """
+    try:
+        parts = _parse(url)
+    except ValueError:
+        return url
+
+    netloc = parts.netloc.lower()
+    default_port = _DEFAULT_PORTS.get(parts.scheme)
+    if default_port and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+
+    path = parts.path
+    query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+    if not query and len(path) > 1 and path.endswith('/') and path[-2] != '/':
+        path = path[:-1]
+
+    return sys.intern(urlunsplit((parts.scheme, netloc, path, query, '')))
+
+
+@lru_cache(maxsize=65536)
 def extract_domain(url: str) -> Optional[str]:
-    """Extract domain from URL"""
+    """
+    Extract domain from URL (memoized, URLs repeat a lot during a crawl)
+
+    The domain is interned: every URL of a host returns the same string
+    object, so per-domain dicts compare keys by identity first.
+    """
+    # One regex match covers onion and clearnet hosts, with or without userinfo/port
+    match = _URL_HOST_RE.match(url)
+    if match:
+        return sys.intern(match.group(1).lower())
+
     try:
-        parsed = urlparse(url)
-        return parsed.hostname
+        host = _parse(url).hostname
+        return sys.intern(host) if host else None
     except Exception:
         return None
 
 
+def url_hash(url: str) -> int:
+    """
+    Return unsigned 64-bit hash of url
+
+    Used instead of the URL string in visited sets (8 bytes vs ~70+ per
+    entry). Collisions are possible but only cause a page to be skipped.
+    """
+    if MMH3_AVAILABLE:
+        return mmh3.hash64(url, signed=False)[0]
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Last formatted second: (epoch seconds, ISO 8601 prefix)
+_ts_cache = (None, '')
+
+
+def format_timestamp(timestamp_ns: int) -> str:
+    """
+    Format nanosecond UTC epoch timestamp as ISO 8601 (naive UTC)
+
+    Same output as datetime.isoformat(). The date/time part is cached per
+    second, so consecutive pages only format their microseconds.
+    """
+    global _ts_cache
+    seconds, nanos = divmod(timestamp_ns, 1_000_000_000)
+    cached_seconds, prefix = _ts_cache
+    if seconds != cached_seconds:
+        prefix = (_EPOCH + timedelta(seconds=seconds)).isoformat()
+        _ts_cache = (seconds, prefix)
+
+    micros = nanos // 1000
+    return f"{prefix}.{micros:06d}" if micros else prefix
+
+
+# Control characters that aren't whitespace (NUL, BEL, DEL, ...) are removed;
+# whitespace controls (tab, newline, ...) are collapsed with the other whitespace
+_CONTROL_CHARS = {c: None for c in (*range(0x20), 0x7f) if not chr(c).isspace()}
+
+
 def sanitize_html_text(text: str, max_length: int = 1000) -> str:
-    """Sanitize HTML text and limit length"""
+    """
+    Sanitize HTML text and limit length
+
+    Cleaning a prefix of text gives a prefix of the fully cleaned text, so
+    only a window a little larger than max_length is processed; it grows
+    only while whitespace collapsing leaves too few characters.
+    """
     if not text:
         return ""
 
-    # Remove extra whitespace and newlines
-    text = re.sub(r'\s+', ' ', text)
-    text = text.strip()
-
-    # Limit length
-    if len(text) > max_length:
-        text = text[:max_length] + "..."
-
-    return text
+    window = 2 * max_length + 64
+    while True:
+        # Remove control characters, extra whitespace and newlines
+        # (str.split() splits on the same whitespace as \s+, in C)
+        cleaned = ' '.join(text[:window].translate(_CONTROL_CHARS).split())
 
+        # Limit length
+        if len(cleaned) > max_length:
+            return f"{cleaned[:max_length]}..."
 
-def is_valid_url_scheme(url: str) -> bool:
-    """Check that URL uses HTTP or HTTPS scheme"""
-    try:
-        parsed = urlparse(url)
-        return parsed.scheme in ['http', 'https']
-    except Exception:
-        return False
+        if window >= len(text):
+            return cleaned
+        window *= 4
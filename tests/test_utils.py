@@ -0,0 +1,117 @@
+"""
+Tests for URL helpers in src.utils
+"""
+
+import random
+import unittest
+from urllib.parse import urljoin
+
+from src.utils import canonicalize_url, normalize_url, normalize_urls
+
+
+def reference_normalize_url(url, base_url):
+    """normalize_url spelled out with a plain urljoin (no caches or shortcuts)"""
+    try:
+        url = urljoin(base_url, url)
+        url = url.partition('#')[0]
+        if url.endswith('/') and '?' not in url and url[-2:-1] != '/':
+            scheme_end = url.find('://')
+            path_start = url.find('/', scheme_end + 3 if scheme_end != -1 else 0)
+            if len(url) - path_start > 1:
+                url = url[:-1]
+        return url
+    except Exception:
+        return None
+
+
+BASES = [
+    'http://abc.onion/dir/page.html?q=1',
+    'http://h/a/b/c',
+    'http://h',
+    'http://h/',
+    'http://h/a/?x=/y/z',
+    'http://u@h:8/a/b#f/g',
+    'http://h/a/b/',
+    'https://h/a?x',
+    'http://h/a;p/b',
+    'http://h/a/..',
+    'http://h?x',
+    'http://h#f',
+    'http://[::1]:80/a/b',
+    'HTTP://h.onion/a',
+    'Https://H.onion/a/b?q',
+    'ftp://h/a/b',
+    'foo://h/a/b',
+    'mailto:x@h',
+]
+
+# Hrefs that once resolved differently from urljoin
+EDGE_HREFS = [
+    '', ' ', '/x', '/a/b?c', ' ?x', ' #a', '\t#a', '/\n/x', 'http:', 'HTTP:', 'https:', 'http:x',
+    'https:/x', 'http://', 'https://', 'http:///a', ';', ';x/y', '/c/;', 'x:y',
+    'mailto:a', 'https://[', 'http://]', '/a/../b', 'http://h/a/?', '/?#x',
+]
+
+# Pieces joined at random into hrefs
+HREF_PARTS = [
+    'a', 'b', '..', '.', '', 'x.html', '?q=/1', '#f', '/', '//h2/p', 'http://h3/z/../w',
+    'http://H4/q', 'c/', '?', '#', ';p', ';', '%2F', ':x', '//', '/.w', ' ', 'https://h/',
+    '?#', '/?#x', '&', '=', 'http://u:p@h:1/', 'HTTP://h/x', '\t', '\n', '\r', '\x00',
+    '\x01', '%', '[', ']', 'http://[::1]:8/x', '@', 'é', '/..', '../', '\x7f', 'https:',
+    'http:', 'https://', 'http://', 'x:', '\\', 'http://@/', 'http://:80/', '?a[]=1',
+]
+
+
+class NormalizeUrlTest(unittest.TestCase):
+    """normalize_url/normalize_urls must agree with a plain urljoin"""
+
+    def assert_matches_reference(self, href, base_url):
+        expected = reference_normalize_url(href, base_url)
+        self.assertEqual(normalize_url(href, base_url), expected, (href, base_url))
+        self.assertEqual(normalize_urls([href], base_url), [expected], (href, base_url))
+
+    def test_edge_cases(self):
+        for base_url in BASES:
+            for href in EDGE_HREFS:
+                self.assert_matches_reference(href, base_url)
+
+    def test_random_hrefs(self):
+        rng = random.Random(0)
+        for _ in range(50000):
+            href = ''.join(rng.choice(HREF_PARTS) for _ in range(rng.randint(0, 5)))
+            self.assert_matches_reference(href, rng.choice(BASES))
+
+    def test_batch_keeps_order(self):
+        base_url = 'http://abc.onion/dir/page.html'
+        hrefs = ['a', '/b', 'http://abc.onion/c/', '#x', '?y']
+        self.assertEqual(
+            normalize_urls(hrefs, base_url),
+            ['http://abc.onion/dir/a', 'http://abc.onion/b', 'http://abc.onion/c',
+             'http://abc.onion/dir/page.html', 'http://abc.onion/dir/page.html?y']
+        )
+
+
+class CanonicalizeUrlTest(unittest.TestCase):
+    """canonicalize_url must not undo what normalize_url keeps"""
+
+    def test_variants_compare_equal(self):
+        self.assertEqual(canonicalize_url('http://H.onion:80/p?b=1&a=2#f'), 'http://h.onion/p?a=2&b=1')
+        self.assertEqual(canonicalize_url('https://h.onion:443/p/'), 'https://h.onion/p')
+
+    def test_keeps_normalized_paths(self):
+        for url in ['http://h.onion/a//', 'http://h.onion/', 'http://h.onion/a/?q', 'http://h.onion//x']:
+            self.assertEqual(canonicalize_url(url), url)
+
+    def test_idempotent_on_normalized_urls(self):
+        rng = random.Random(1)
+        for _ in range(5000):
+            href = ''.join(rng.choice(HREF_PARTS) for _ in range(rng.randint(0, 5)))
+            url = normalize_url(href, rng.choice(BASES))
+            if url and url.startswith('http'):
+                canonical = canonicalize_url(url)
+                self.assertEqual(canonicalize_url(canonical), canonical, url)
+                self.assertEqual(canonicalize_url(normalize_url(canonical)), canonical, url)
+
+
+if __name__ == '__main__':
+    unittest.main()